@@ -7,10 +7,10 @@ to the Pi to react to the audio.
 
 Prerequisites:
 1.  Raspberry Pi 5 with Raspberry Pi OS (Bullseye or later)
-2.  Python 3.7 or later
+2.  Python 3.10 or later (required by numpy-rms)
 3.  WS2812B LED strip connected to the Pi
 4.  USB Microphone
-5.  Libraries: sounddevice, numpy, rpi_ws281x
+5.  Libraries: sounddevice, numpy, numpy-rms, rpi_ws281x
 
 Installation:
 
@@ -20,7 +20,7 @@ Installation:
 
 2.  Install the necessary Python libraries:
     sudo apt install libportaudio2 libportaudiocpp0
-    pip3 install sounddevice numpy
+    pip3 install sounddevice numpy numpy-rms
 
 3.  Install rpi_ws281x:
     sudo apt install python3-rpi.gpio
@@ -41,7 +41,8 @@ Configuration:
 * Sensitivity: Adjust `SENSITIVITY` to control how much the LEDs react
     to the audio.
 * Color Mapping:  The `calculate_color` function maps audio amplitude to
-    LED colors.  You can customize this for different color effects.
+    LED colors.  You can customize this for different color effects.  It
+    is sampled into `COLOR_LUT` at startup.
 
 Running the Script:
 
@@ -64,14 +65,18 @@ Troubleshooting:
     accessing hardware, try running the script with `sudo python3 ...`.
 """
 
+import ctypes
+import os
 import sounddevice as sd
 import numpy as np
+import numpy_rms
 import time
 
 # Configuration
 LED_COUNT = 30  # Number of LEDs in your strip
 LED_TYPE = 'WS281x'  #  'WS281x'
 AUDIO_DEVICE_INDEX = None  # Use None for default microphone, or specify the device index
+BLOCK_SIZE = 512  # Audio frames per callback (keep this a power of 2)
 SENSITIVITY = 100  # Adjust to make the LEDs more or less sensitive to sound
 
 if LED_TYPE == 'WS281x':
@@ -90,6 +95,8 @@ else:
     print("Error: Invalid LED_TYPE.  Choose 'WS281x' or 'Blinkt'.")
     exit()
 
+last_color = None  # Uniform color on the strip, None after set_leds
+
 def calculate_color(amplitude):
     """
     Maps audio amplitude to an RGB color.  This function can be customized
@@ -116,13 +123,57 @@ def calculate_color(amplitude):
         b = 0
     return r, g, b
 
+# Precompute calculate_color at every output step of its gradient (three
+# segments of 255 steps), so the audio callback only has to index a table.
+# Each entry is sampled mid-step to stay clear of float rounding at the edges.
+COLOR_STEPS = 3 * 255
+COLOR_LUT = np.empty((COLOR_STEPS + 1, 3), np.uint8)
+for i in range(COLOR_STEPS + 1):
+    COLOR_LUT[i] = calculate_color((i + 0.5) * SENSITIVITY / COLOR_STEPS)
+
+def raise_priority():
+    """
+    Raises scheduling priority and pins the process to core 3 (needs root).
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(80))
+    except PermissionError:
+        print("Warning: could not raise process priority (run as root).")
+    # Keep off core 0, which services most interrupts on the Pi
+    try:
+        if 3 in os.sched_getaffinity(0):
+            os.sched_setaffinity(0, {3})
+    except OSError:
+        print("Warning: could not pin process to CPU 3.")
+
+def get_led_buffer(strip):
+    """
+    Returns a numpy view of the strip's pixel buffer so colors can be written
+    in bulk instead of one setPixelColor call per LED.  Must be called after
+    strip.begin(), which is what allocates the buffer.
+
+    Args:
+        strip: An initialized rpi_ws281x.Adafruit_NeoPixel object.
+
+    Returns:
+        A uint32 numpy array with one packed color word per LED.
+    """
+    channel = rpi_ws281x.ws2811_channel_get(strip._leds, LED_CHANNEL)
+    leds = rpi_ws281x.ws2811_channel_t_leds_get(channel)
+    buffer_type = ctypes.c_uint32 * LED_COUNT
+    return np.frombuffer(buffer_type.from_address(int(leds)), dtype=np.uint32)
+
 def set_leds(led_data):
     """
-    Sets the colors of the LEDs.
+    Sets the colors of the LEDs individually.  Use set_leds_uniform when
+    every LED shows the same color.
 
     Args:
         led_data: A list of RGB tuples, one for each LED.
     """
+    global last_color
+    last_color = None  # The strip no longer shows a single color
+
     if LED_TYPE == 'WS281x':
         for i, color in enumerate(led_data):
             r, g, b = color
@@ -135,13 +186,35 @@ def set_leds(led_data):
             blinkt.set_pixel(i, r, g, b)
         blinkt.show()
 
+def set_leds_uniform(color):
+    """
+    Sets every LED to the same color.
+
+    Args:
+        color: An RGB tuple applied to all LEDs.
+    """
+    global last_color
+    color = tuple(color)
+    if color == last_color:
+        return  # Nothing changed, skip the refresh
+    last_color = color
+
+    r, g, b = color
+    if LED_TYPE == 'WS281x':
+        # Convert RGB to WS281x color format (GRB) once for the whole strip
+        led_buffer.fill((g << 16) | (r << 8) | b)
+        led_strip.show()
+    elif LED_TYPE == 'Blinkt':
+        blinkt.set_all(r, g, b)
+        blinkt.show()
+
 def audio_callback(indata, frames, time, status):
     """
     Callback function for the sounddevice audio stream.  This function
     is called whenever a new chunk of audio data is available.
 
     Args:
-        indata:  The audio data as a numpy array.
+        indata:  The raw audio data as a cffi buffer of float32 samples.
         frames:  The number of frames in the audio data.
         time:    A sounddevice.CallbackTime object (not used here).
         status:  A sounddevice.CallbackFlags object (checks for errors).
@@ -151,17 +224,20 @@ def audio_callback(indata, frames, time, status):
         return
 
     # Calculate the amplitude of the audio data.  We use the RMS (root mean
-    # square) of the audio signal as a measure of its loudness.
-    amplitude = np.sqrt(np.mean(indata**2))
+    # square) of the audio signal as a measure of its loudness.  numpy_rms
+    # does the square-accumulate in a single SIMD pass with no temporary
+    # array, but needs a contiguous 1-D float32 buffer, which a view of the
+    # raw mono buffer already is.
+    mono = np.frombuffer(indata, dtype=np.float32, count=frames)
+    amplitude = float(numpy_rms.rms(mono, window_size=mono.shape[0])[0])
     # print(f"Amplitude: {amplitude}") #for debugging
 
-    # Calculate LED colors based on the amplitude.
-    led_colors = []
-    for _ in range(LED_COUNT):
-        led_colors.append(calculate_color(amplitude))
+    # Every LED shows the same color, so look it up once.
+    idx = min(COLOR_STEPS, int(amplitude * COLOR_STEPS / SENSITIVITY))
+    color = COLOR_LUT[idx].tolist()
 
     # Set the LED colors.
-    set_leds(led_colors)
+    set_leds_uniform(color)
 
 if __name__ == '__main__':
     try:
@@ -174,16 +250,21 @@ if __name__ == '__main__':
             )
             # Intialize the library (must be called once before using).
             led_strip.begin()
+            led_buffer = get_led_buffer(led_strip)
             print("WS281x LED strip initialized.")
         elif LED_TYPE == 'Blinkt':
             blinkt.set_brightness(0.5)  # Adjust brightness as needed (0.0 to 1.0)
             print("Blinkt! LED strip initialized.")
 
+        raise_priority()
+
         # Open an audio input stream.
-        with sd.InputStream(
+        with sd.RawInputStream(
             device=AUDIO_DEVICE_INDEX,
             channels=1,  # Mono audio
             dtype='float32',  # Important: Use float32 for audio processing
+            blocksize=BLOCK_SIZE,
+            latency='low',  # PortAudio's default on ALSA is 'high'
             callback=audio_callback,
         ):
             print("Listening for audio... Press Ctrl+C to stop.")
@@ -1,8 +1,11 @@
+import ctypes
+import math
+import os
 import sounddevice as sd
 import numpy as np
+import numpy_rms
 import rpi_ws281x as ws
 import time
-import threading
 
 class AudioVisualizer:
     """
@@ -10,7 +13,8 @@ class AudioVisualizer:
     """
     def __init__(self, led_count, led_pin, led_freq_hz, led_dma, led_invert,
                  led_brightness, led_channel, led_strip,
-                 sample_rate, chunk_size, min_db, max_db, sensitivity):
+                 sample_rate, chunk_size, min_db, max_db, sensitivity,
+                 history_chunks=1):
         """
         Initializes the AudioVisualizer object.
 
@@ -24,10 +28,12 @@ class AudioVisualizer:
             led_channel (int): Channel 0 or 1.
             led_strip (int): Strip type (e.g., ws.WS2811_STRIP_GRB).
             sample_rate (int): Samples per second.
-            chunk_size (int): Number of audio samples per chunk.
+            chunk_size (int): Number of audio samples per chunk (a power of 2).
             min_db (int): Minimum decibel level to register sound.
             max_db (int): Maximum decibel level.
             sensitivity (int): Adjust to change LED reactivity.
+            history_chunks (int): Number of recent chunks the RMS is taken
+                over to smooth the brightness (default 1, no smoothing).
         """
         # LED strip configuration
         self.led_count = led_count
@@ -45,55 +51,53 @@ class AudioVisualizer:
         self.min_db = min_db
         self.max_db = max_db
         self.sensitivity = sensitivity
+        # -20*log10(p_ref) with p_ref = 20e-6, so that
+        # 20*log10(rms / p_ref) becomes 20*log10(rms) + this constant
+        self.neg_20_log10_pref = -20 * math.log10(20e-6)
+        # Brightness for every 0.1 dB step from 0 dB to just past max_db, so
+        # mapping a level to brightness is a single table lookup
+        db_steps = np.arange(0, (max_db + 1) * 10) / 10
+        self.brightness_lut = np.clip((db_steps - min_db) * 255 / (max_db - min_db),
+                                      0, 255).astype(np.uint8).tolist()
+        self.brightness_lut_max = len(self.brightness_lut) - 1
+
+        # Ring of mean squares (RMS**2) for the last history_chunks chunks,
+        # plus their running sum
+        self.history_chunks = history_chunks
+        self.history = [0.0] * history_chunks
+        self.history_sum = 0.0
+        self.history_index = 0
 
         # Global variables
         self.strip = None
-        self.audio_data = []
-        self.audio_event = threading.Event()
-        self.running = True
+        self.num_pixels = 0  # cached strip.numPixels(), set once in run()
+        self.leds = None  # numpy view of the strip's pixel buffer
+        self.last_brightness = None  # brightness currently shown on the strip
         self.stream = None  # To store the audio stream object
 
-    def get_decibel_level(self, audio_chunk):
+    def rms_to_brightness(self, rms):
         """
-        Calculates the decibel level of an audio chunk.
+        Converts the RMS of an audio chunk to its decibel level and looks up
+        the matching brightness value.
 
         Args:
-            audio_chunk (numpy.ndarray): Audio data.
-
-        Returns:
-            float: Decibel level.
-        """
-        if np.any(audio_chunk):
-            p_ref = 20e-6
-            rms = np.sqrt(np.mean(audio_chunk**2))
-            if rms > 0:
-                db = 20 * np.log10(rms / p_ref)
-                return max(self.min_db, db)
-            else:
-                return self.min_db
-        else:
-            return self.min_db
-
-    def map_brightness(self, db):
-        """
-        Maps decibel levels to brightness values.
-
-        Args:
-            db (float): Decibel level.
+            rms (float): RMS amplitude of the audio chunk.
 
         Returns:
             int: Brightness value (0-255).
         """
-        clamped_db = max(self.min_db, min(self.max_db, db))
-        brightness = int((clamped_db - self.min_db) / (self.max_db - self.min_db) * 255)
-        return brightness
+        if rms <= 0:
+            return 0
+        db = 20 * math.log10(rms) + self.neg_20_log10_pref
+        return self.brightness_lut[min(self.brightness_lut_max, max(0, int(db * 10)))]
 
     def audio_callback(self, indata, frames, time, status):
         """
-        Callback function for the audio stream.
+        Callback function for the audio stream.  Processes the chunk and
+        updates the LED strip directly, without handing off to another thread.
 
         Args:
-            indata (numpy.ndarray): Audio data from the input device.
+            indata (cffi.buffer): Raw float32 audio data from the input device.
             frames (int): Number of frames in the audio chunk.
             time (cffi.CData): Time information (not used here).
             status (sounddevice.CallbackFlags): Status flags.
@@ -102,26 +106,56 @@ class AudioVisualizer:
             print(f"Error in audio stream: {status}")
             return
 
-        self.audio_data = indata.copy()
-        self.audio_event.set()
-
-    def update_leds(self):
+        mono = np.frombuffer(indata, dtype=np.float32, count=frames)
+        rms = float(numpy_rms.rms(mono, window_size=frames)[0])
+        if self.history_chunks > 1:
+            # Only the newest chunk is computed; the RMS over the whole
+            # window is the root of the mean of the cached mean squares.
+            mean_square = rms * rms
+            self.history_sum += mean_square - self.history[self.history_index]
+            self.history[self.history_index] = mean_square
+            self.history_index = (self.history_index + 1) % self.history_chunks
+            # Clamp float drift in the running sum before the sqrt
+            rms = math.sqrt(max(0.0, self.history_sum) / self.history_chunks)
+        brightness = self.rms_to_brightness(rms)
+        if brightness == self.last_brightness:
+            return  # Nothing changed, skip the refresh
+        self.last_brightness = brightness
+
+        # Same word as ws.Color(0, brightness, 0): green is bits 8-15
+        self.leds.fill(brightness << 8)
+        # show() only waits for the previous DMA transfer and starts the
+        # next one, which fits well within a chunk period.
+        self.strip.show()
+
+    def raise_priority(self):
         """
-        Updates the LED strip based on the processed audio data.
+        Switches to SCHED_FIFO and pins to CPU 3 so the audio callback runs
+        with low jitter.  Call before opening the stream (needs root).
         """
-        while self.running:
-            self.audio_event.wait()
-            self.audio_event.clear()
-            if not self.running:
-                break
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(80))
+        except PermissionError:
+            print("Warning: could not raise process priority (run as root).")
+        # Keep off core 0, which services most interrupts on the Pi
+        try:
+            if 3 in os.sched_getaffinity(0):
+                os.sched_setaffinity(0, {3})
+        except OSError:
+            print("Warning: could not pin process to CPU 3.")
 
-            if len(self.audio_data) > 0:
-                db = self.get_decibel_level(self.audio_data[:, 0])
-                brightness = self.map_brightness(db)
+    def get_led_buffer(self):
+        """
+        Returns a numpy view of the strip's pixel buffer, so that all LEDs can
+        be written with one fill instead of a setPixelColor call per LED.
 
-                for i in range(self.strip.numPixels()):
-                    self.strip.setPixelColor(i, ws.Color(0, brightness, 0))
-                self.strip.show()
+        Returns:
+            numpy.ndarray: uint32 array with one packed color word per LED.
+        """
+        channel = ws.ws2811_channel_get(self.strip._leds, self.led_channel)
+        leds = ws.ws2811_channel_t_leds_get(channel)
+        buffer_type = ctypes.c_uint32 * self.num_pixels
+        return np.frombuffer(buffer_type.from_address(int(leds)), dtype=np.uint32)
 
     def run(self):
         """
@@ -132,18 +166,18 @@ class AudioVisualizer:
                                             self.led_dma, self.led_invert, self.led_brightness,
                                             self.led_channel, self.led_strip)
         self.strip.begin()
+        self.num_pixels = self.strip.numPixels()
+        self.leds = self.get_led_buffer()
+
+        self.raise_priority()
 
         # Initialize and start the audio stream
         try:
-            self.stream = sd.InputStream(callback=self.audio_callback, samplerate=self.sample_rate,
-                                         blocksize=self.chunk_size, channels=1)
+            self.stream = sd.RawInputStream(callback=self.audio_callback, samplerate=self.sample_rate,
+                                            blocksize=self.chunk_size, channels=1, dtype='float32',
+                                            latency='low')
             self.stream.start()
 
-            # Start the LED update thread
-            led_thread = threading.Thread(target=self.update_leds)
-            led_thread.daemon = True
-            led_thread.start()
-
             print("Listening for audio... Press Ctrl+C to stop.")
             while True:
                 time.sleep(1)
@@ -151,13 +185,11 @@ class AudioVisualizer:
             print(f"Error: {e}")
         except KeyboardInterrupt:
             print("\nStopping...")
-            self.running = False
-            self.audio_event.set()  # Ensure led_thread wakes up
             if self.stream:
                 self.stream.stop()
                 self.stream.close()
             # Turn off LEDs before exiting
-            for i in range(self.strip.numPixels()):
+            for i in range(self.num_pixels):
                 self.strip.setPixelColor(i, ws.Color(0, 0, 0))
             self.strip.show()
             print("Exiting...")
@@ -175,6 +207,7 @@ if __name__ == "__main__":
 
     sample_rate = 44100
     chunk_size = 512
+    history_chunks = 1  # Raise (e.g. 4) to smooth brightness over more chunks
     min_db = 40
     max_db = 90
     sensitivity = 200
@@ -182,5 +215,6 @@ if __name__ == "__main__":
     # Create and run the audio visualizer
     visualizer = AudioVisualizer(led_count, led_pin, led_freq_hz, led_dma, led_invert,
                                  led_brightness, led_channel, led_strip,
-                                 sample_rate, chunk_size, min_db, max_db, sensitivity)
+                                 sample_rate, chunk_size, min_db, max_db, sensitivity,
+                                 history_chunks)
     visualizer.run()